@@ -104,39 +104,46 @@ if __name__ == '__main__':
     # store states (current and predicted) and actions
     # TODO:
     # create a data logger class to make it cleaner
-    # format: (timestep x data) x episodes
-    states = np.zeros((n_steps, n_states, n_episodes))
-    pred_states = np.zeros((n_steps, n_states, n_episodes))
-    controls = np.zeros((n_steps, n_controls, n_episodes))
+    # format: episodes x timesteps x data (episode outermost so the
+    # per-step write is one unit-stride copy)
+    states = np.zeros((n_episodes, n_steps, n_states))
+    pred_states = np.zeros((n_episodes, n_steps, n_states))
+    controls = np.zeros((n_episodes, n_steps, n_controls))
 
     print('[*] Simulating...')
+
+    # bind the per-step calls to locals (same as the online modeling loop)
+    _act = agent.act
+    _step = env.step
+    _predict = eval_model.predict_next_states
+
     for i in range(n_episodes):
         print('[*] Episode {} out of {}'.format(i+1, n_episodes))
         # get initial states
         state = env.reset()
 
         # log initial data
-        states[0, :, i] = state
-        pred_states[0, :, i] = state
-        controls[0, :, i] = np.zeros(n_controls)
+        states[i, 0] = state
+        pred_states[i, 0] = state
+        controls[i, 0] = np.zeros(n_controls)
 
         for j in range(1, n_steps):
             if j%100 == 0:
                 print('[*] Time step {}+/{}'.format(j,n_steps))
 
             # compute control based on current state
-            control = agent.act(state)
+            control = _act(state)
 
             # predict next states
-            pred_state = eval_model.predict_next_states(pred_states[j-1, :, i], control)
+            pred_state = _predict(pred_states[i, j-1], control)
 
             # execute control and observe next states
-            state, _, done, _ = env.step(control)
+            state, _, done, _ = _step(control)
 
             # log data
-            states[j, :, i] = state
-            pred_states[j, :, i] = pred_state
-            controls[j, :, i] = control
+            states[i, j] = state
+            pred_states[i, j] = pred_state
+            controls[i, j] = control
 
 
     # close everything
@@ -154,9 +161,9 @@ if __name__ == '__main__':
                 if l == 0:
                     plt.title('Episode {} out of {}'.format(k+1, n_episodes))
 
-                plt.plot(states[:, l, k], '-',
+                plt.plot(states[k, :, l], '-',
                          label='x{}'.format(l))
-                plt.plot(pred_states[:, l, k], '--',
+                plt.plot(pred_states[k, :, l], '--',
                          label='pred_x{}'.format(l))
 
                 plt.grid()
@@ -165,7 +172,7 @@ if __name__ == '__main__':
             # plot controls
             plt.subplot(n_states+1, 1, n_states+1)
             for m in range(n_controls):
-                plt.plot(controls[:, m, k], label='u{}'.format(m))
+                plt.plot(controls[k, :, m], label='u{}'.format(m))
 
             plt.grid()
             plt.legend(loc='best')
@@ -5,22 +5,352 @@ Handles online modeling and model creation classes.
 
 # VERSION UPDATES
 0.0.1 (Apr/17/2018) : initial release
+0.0.2 (Aug/26/2026) : moved MemoryBuffer here and switched it to a
+                      structure-of-arrays layout (contiguous input/output
+                      arrays instead of a structured dtype)
 
 """
 __author__ = "Vinicius G. Goecks"
-__version__ = "0.0.1"
-__date__ = "April 17, 2018"
+__version__ = "0.0.2"
+__date__ = "August 26, 2026"
 
 # import
 import numpy as np
 import matplotlib.pyplot as plt
 
+import multiprocessing
 import threading
 import sys, os
 import time
 
 import tensorflow as tf
 
+# numba is optional: when available the hot buffer routines are compiled,
+# otherwise the same code runs as plain Python
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        def wrap(func):
+            return func
+        return wrap
+
+# indices into the MemoryBuffer counters array (kept together in one int64
+# array so the jitted add routine can update them in place)
+BUF_COUNTER = 0
+BUF_FILLED = 1
+VAL_COUNTER = 2
+VAL_FILLED = 3
+TOTAL_ADDED = 4  # monotonic count of buffer writes (never wraps)
+N_COUNTERS = 5
+
+
+@njit(cache=True, fastmath=True)
+def _add(buf_in, buf_out, val_in, val_out, counters, current_state, control,
+         next_state, n_states, buffer_size, val_data_size):
+    """ Compiled core of MemoryBuffer.add_to_buffer.
+
+    Works on the raw arrays and the counters array so the whole per-step
+    bookkeeping (index math, branch on which set to fill, element copies)
+    runs without Python dispatch. Returns True on the call that completes
+    the validation set.
+    """
+    n_controls = control.shape[0]
+    filled_val = False
+
+    # validation set fills first
+    if counters[VAL_FILLED] == 0:
+        idx = counters[VAL_COUNTER]
+        for k in range(n_states):
+            val_in[idx, k] = current_state[k]
+            val_out[idx, k] = next_state[k] - current_state[k]
+        for k in range(n_controls):
+            val_in[idx, n_states + k] = control[k]
+
+        counters[VAL_COUNTER] += 1
+        if counters[VAL_COUNTER] == val_data_size:
+            counters[VAL_FILLED] = 1
+            filled_val = True
+
+    else:  # ring buffer: overwrite older experiences when full
+        if counters[BUF_COUNTER] >= buffer_size:
+            counters[BUF_COUNTER] = 0
+            counters[BUF_FILLED] = 1
+
+        idx = counters[BUF_COUNTER]
+        for k in range(n_states):
+            buf_in[idx, k] = current_state[k]
+            buf_out[idx, k] = next_state[k] - current_state[k]
+        for k in range(n_controls):
+            buf_in[idx, n_states + k] = control[k]
+
+        counters[BUF_COUNTER] += 1
+        counters[TOTAL_ADDED] += 1
+
+    return filled_val
+
+
+def _add_numpy(buf_in, buf_out, val_in, val_out, counters, current_state,
+               control, next_state, n_states, buffer_size, val_data_size):
+    """ Numpy fallback for _add, used when numba is not installed.
+
+    Same bookkeeping, but written with slice stores and an in-place
+    subtraction (np.subtract with out=) straight into the destination
+    row, so there are still no temporaries per call.
+    """
+    filled_val = False
+
+    # validation set fills first
+    if counters[VAL_FILLED] == 0:
+        idx = counters[VAL_COUNTER]
+        val_in[idx, :n_states] = current_state
+        val_in[idx, n_states:] = control
+        np.subtract(next_state, current_state, out=val_out[idx])
+
+        counters[VAL_COUNTER] += 1
+        if counters[VAL_COUNTER] == val_data_size:
+            counters[VAL_FILLED] = 1
+            filled_val = True
+
+    else:  # ring buffer: overwrite older experiences when full
+        if counters[BUF_COUNTER] >= buffer_size:
+            counters[BUF_COUNTER] = 0
+            counters[BUF_FILLED] = 1
+
+        idx = counters[BUF_COUNTER]
+        buf_in[idx, :n_states] = current_state
+        buf_in[idx, n_states:] = control
+        np.subtract(next_state, current_state, out=buf_out[idx])
+
+        counters[BUF_COUNTER] += 1
+        counters[TOTAL_ADDED] += 1
+
+    return filled_val
+
+
+class MemoryBuffer(object):
+    """ Stores experienced states and controls for modeling.
+
+    Experiences are defined as:
+    [current_states, control_applied] -> [(next_states - current_states)]
+
+    This class also handles the creation of a validation set. This is filled
+    before the memory buffer so the learned model can be evaluated on unseen
+    data (not the same data from the memory buffer that is used to improve
+    the model).
+
+    Experiences are stored as two contiguous arrays (inputs and outputs,
+    structure-of-arrays) so per-step writes and batch slices are
+    unit-stride and can be fed to the model without extra copies.
+
+    Arguments
+    ==================
+    env: plant to model (alternatively pass n_states/n_controls directly,
+         e.g. inside a worker process that has no environment)
+    buffer_size: number of experiences to store
+    val_data_size: number of experiences held out for validation
+    shared: allocate the backing arrays in shared memory so a training
+            process can see the simulation's writes with zero copy
+    shared_arrays: attach to shared arrays allocated by another process
+                   instead of allocating new storage
+    dtype: storage dtype of the experience arrays. np.float16 halves the
+           bytes read per batch, which is plenty of precision for the
+           state ranges modeled here. Shared-memory buffers are always
+           float32 (ctypes has no half type).
+    """
+
+    def __init__(self, env=None, buffer_size=100, val_data_size=100,
+                 n_states=None, n_controls=None, shared=False,
+                 shared_arrays=None, dtype=np.float32):
+        self.env = env
+        self.buffer_size = buffer_size
+        self.val_data_size = val_data_size
+        if shared or shared_arrays is not None:
+            dtype = np.float32
+        self.dtype = np.dtype(dtype)
+
+        # per-instance generator (PCG64): skips the locking and legacy
+        # dispatch of the global numpy RNG in the sampling hot path
+        self._rng = np.random.default_rng()
+
+        # compiled insert when numba is around, vectorized numpy otherwise
+        # (numba's nopython mode has no float16 arithmetic, so half-
+        # precision buffers always take the numpy path)
+        if NUMBA_AVAILABLE and self.dtype == np.float32:
+            self._add_fn = _add
+        else:
+            self._add_fn = _add_numpy
+
+        # create buffer
+        if env is not None:
+            n_states = env.observation_space.shape[0]
+            n_controls = env.action_space.shape[0]
+        self.n_states = n_states
+        self.n_controls = n_controls
+        self.n_inputs = self.n_states + self.n_controls
+        self.n_outputs = self.n_states
+
+        if shared_arrays is None and shared:
+            # allocate the backing store in shared memory (lock-free: the
+            # counters are only advanced by the writing process)
+            shared_arrays = {
+                'buf_in': multiprocessing.Array(
+                    'f', self.buffer_size * self.n_inputs, lock=False),
+                'buf_out': multiprocessing.Array(
+                    'f', self.buffer_size * self.n_outputs, lock=False),
+                'val_in': multiprocessing.Array(
+                    'f', self.val_data_size * self.n_inputs, lock=False),
+                'val_out': multiprocessing.Array(
+                    'f', self.val_data_size * self.n_outputs, lock=False),
+                'counters': multiprocessing.Array(
+                    'q', N_COUNTERS, lock=False),
+            }
+        self.shared_arrays = shared_arrays
+
+        if shared_arrays is None:
+            # buffer as structure-of-arrays: inputs and outputs live in
+            # separate contiguous arrays
+            self.buf_in = np.empty((self.buffer_size, self.n_inputs),
+                                   dtype=self.dtype)
+            self.buf_out = np.empty((self.buffer_size, self.n_outputs),
+                                    dtype=self.dtype)
+
+            # create validation set (same layout as the buffer)
+            self.val_in = np.empty((self.val_data_size, self.n_inputs),
+                                   dtype=self.dtype)
+            self.val_out = np.empty((self.val_data_size, self.n_outputs),
+                                    dtype=self.dtype)
+
+            # buffer/validation counters and filled flags, packed in a
+            # single int64 array shared with the jitted add routine
+            self._counters = np.zeros(N_COUNTERS, dtype=np.int64)
+        else:
+            # same layout, but viewing the (possibly inherited) shared
+            # memory instead of owning the storage
+            self.buf_in = np.frombuffer(
+                shared_arrays['buf_in'], dtype=np.float32).reshape(
+                    self.buffer_size, self.n_inputs)
+            self.buf_out = np.frombuffer(
+                shared_arrays['buf_out'], dtype=np.float32).reshape(
+                    self.buffer_size, self.n_outputs)
+            self.val_in = np.frombuffer(
+                shared_arrays['val_in'], dtype=np.float32).reshape(
+                    self.val_data_size, self.n_inputs)
+            self.val_out = np.frombuffer(
+                shared_arrays['val_out'], dtype=np.float32).reshape(
+                    self.val_data_size, self.n_outputs)
+            self._counters = np.frombuffer(
+                shared_arrays['counters'], dtype=np.int64)
+
+    @property
+    def buffer_counter(self):
+        """ Index where the next experience will be placed. """
+        return int(self._counters[BUF_COUNTER])
+
+    @property
+    def buffer_filled(self):
+        """ True once the buffer wrapped around for the first time. """
+        return bool(self._counters[BUF_FILLED])
+
+    @property
+    def val_data_counter(self):
+        """ Index where the next validation experience will be placed. """
+        return int(self._counters[VAL_COUNTER])
+
+    @property
+    def val_data_filled(self):
+        """ True once the validation set is complete. """
+        return bool(self._counters[VAL_FILLED])
+
+    @property
+    def total_experiences(self):
+        """ Monotonic count of experiences written to the ring buffer
+        (unlike buffer_counter, it never wraps).
+        """
+        return int(self._counters[TOTAL_ADDED])
+
+    def add_to_buffer(self, current_state, control, next_state):
+        """ Organize data to fit buffer and manage number of experiences added.
+
+        Initially fills the validation data set, then fills the memory buffer.
+
+        This runs once per simulation step, so all the work happens in the
+        compiled (or vectorized) add routine; this method only forwards
+        the raw arrays.
+        """
+        filled_val = self._add_fn(self.buf_in, self.buf_out, self.val_in,
+                                  self.val_out, self._counters,
+                                  np.asarray(current_state),
+                                  np.asarray(control),
+                                  np.asarray(next_state), self.n_states,
+                                  self.buffer_size, self.val_data_size)
+
+        if filled_val:
+            print('[*] Filled validation set.')
+
+    def generate_batch(self, batch_size=1, shuffle=False):
+        """ Sample and return batch of experiences
+        """
+        counters = self._counters
+
+        # check if buffer is filled
+        if counters[BUF_FILLED]:
+            # start batch from anywhere in the buffer
+            initial_idx = int(self._rng.integers(
+                0, self.buffer_size - batch_size))
+            final_idx = initial_idx + batch_size
+
+        # if not, check if at least have enough experiences to return batch
+        elif batch_size < counters[BUF_COUNTER]:
+            # start batch from anywhere in the filled part of buffer
+            initial_idx = int(self._rng.integers(
+                0, counters[BUF_COUNTER] - batch_size))
+            final_idx = initial_idx + batch_size
+        else:
+            # buffer doest have enough data to generate batch
+            return None, None
+
+        # sample buffer (contiguous views, no copy)
+        input_data = self.buf_in[initial_idx:final_idx]
+        output_data = self.buf_out[initial_idx:final_idx]
+
+        return input_data, output_data
+
+    def iter_batches(self, batch_size=1):
+        """ Persistent batch iterator for the training loop.
+
+        generate_batch re-reads the buffer state and rebuilds its locals
+        on every call; this generator hoists them once and then yields
+        contiguous (input, output) windows forever -- (None, None) while
+        the buffer does not hold enough data yet. The yielded arrays are
+        views into the buffer, no copies.
+        """
+        buf_in = self.buf_in
+        buf_out = self.buf_out
+        counters = self._counters
+        buffer_size = self.buffer_size
+        integers = self._rng.integers
+
+        while True:
+            # start batch from anywhere in the filled part of the buffer
+            if counters[BUF_FILLED]:
+                high = buffer_size - batch_size
+            else:
+                high = counters[BUF_COUNTER] - batch_size
+
+            if high > 0:
+                initial_idx = int(integers(0, high))
+                final_idx = initial_idx + batch_size
+                yield (buf_in[initial_idx:final_idx],
+                       buf_out[initial_idx:final_idx])
+            else:
+                # buffer doesn't have enough data to generate batch
+                yield None, None
+
+
 class ThreadingModeling(object):
     """ Running the modeling functions on the background:
 
@@ -81,7 +411,8 @@ class ThreadingModeling(object):
 
         # save model internally and dump on file
         self.model = model
-        self.model.save('./experiments/' + self.run_id + '/initial_model.h5')
+        self.model.save(os.path.join('./experiments', self.run_id,
+                                     'initial_model.h5'))
         """
         self.sess = tf.Session()
         print('[*] Initializing model...')
@@ -118,14 +449,38 @@ class ThreadingModeling(object):
             tf.summary.scalar('loss', loss)
 
         optimizer = tf.train.AdamOptimizer(learning_rate=0.001)
+
+        # let TF rewrite the graph to run the dense layers in float16
+        # with automatic loss scaling where the runtime supports it
+        # (variables and the output stay float32)
+        if hasattr(tf.train, 'experimental') and hasattr(
+                tf.train.experimental,
+                'enable_mixed_precision_graph_rewrite'):
+            optimizer = \
+                tf.train.experimental.enable_mixed_precision_graph_rewrite(
+                    optimizer)
+
         train_op = optimizer.minimize(loss)
 
+        # keep handles to the ops so the update loop can run them
+        self.input_layer = input_layer
+        self.output_label = output_label
+        self.output_layer = output_layer
+        self.loss = loss
+        self.train_op = train_op
+
+        # reusable input row for predict_next_states, so the per-tick
+        # prediction allocates nothing
+        self._pred_scratch = np.empty((1, self.memory.n_inputs),
+                                      dtype=np.float32)
+
         # initialize vars
         self.sess.run(tf.global_variables_initializer())
 
         # run graph
         merged_summary_op = tf.summary.merge_all()
-        writer = tf.summary.FileWriter('./experiments/' + self.run_id, self.sess.graph)
+        writer = tf.summary.FileWriter(
+            os.path.join('./experiments', self.run_id), self.sess.graph)
 
         # # test run
         # for i in range(1000):
@@ -142,68 +497,103 @@ class ThreadingModeling(object):
 
     def __update_model(self):
         """ Receive new batch of data and update model.
+
+        Runs the precompiled train op directly on each batch (no per-call
+        graph setup) and only evaluates the full validation set every few
+        updates.
         """
+        # how many updates to run between validation passes
+        val_update_interval = 10
+        n_updates = 0
+        val_loss = np.inf
+
+        # persistent batch iterator over the experience buffer
+        batches = self.memory.iter_batches(batch_size=self.batch_size)
+
+        # deadline-based pacing on the monotonic clock, same scheme as
+        # the simulation loop
+        next_deadline = time.perf_counter()
+
+        # total buffer writes seen at the last update
+        last_trained = -1
+
         while self.keep_computing_model:
-            start_time = time.time()
+            # nothing new since the last update: retraining on the same
+            # window is wasted work that only steals interpreter time
+            # from the simulation loop
+            n_experiences = self.memory.total_experiences
+            if n_experiences == last_trained:
+                time.sleep(0.001)
+                next_deadline = time.perf_counter()
+                continue
 
             # receive new data
-            input_data, output_data = self.memory.generate_batch(
-                batch_size=self.batch_size)
+            input_data, output_data = next(batches)
 
             # only update model when validation set is ready to use
             if self.memory.val_data_filled:
                 if input_data is not None:
                     # update model if data is not None
-
-                    # prepare validation data
-                    val_input = self.memory.val_data['data_in']
-                    val_output = self.memory.val_data['data_out']
-
-                    # # TODO: both options below seem to work fine, but need to do
-                    # # some research (or testing) to see if they are equivalent
-                    # option 1
-                    hist = self.model.fit( input_data, output_data, epochs=1,
-                                   steps_per_epoch=1, verbose=0,
-                                   validation_data=(val_input, val_output),
-                                   validation_steps=1)
-                    # # option 2
-                    # self.model.train_on_batch(input_data, output_data)
+                    train_loss, _ = self.sess.run(
+                        [self.loss, self.train_op],
+                        feed_dict={self.input_layer: input_data,
+                                   self.output_label: output_data})
+                    last_trained = n_experiences
+
+                    # evaluate on validation data every few updates
+                    if n_updates % val_update_interval == 0:
+                        val_loss = self.sess.run(
+                            self.loss,
+                            feed_dict={self.input_layer: self.memory.val_in,
+                                       self.output_label:
+                                           self.memory.val_out})
+                    n_updates += 1
 
                     # update list that tracks when model was updated
                     # print('[*] Model updated.')
                     self.track_model.append((self.epi_n+1, self.step_n))
 
-                    # save fit history
-                    self.hist_train.append( (hist.history['loss'][0],
-                                             hist.history['val_loss'][0]) )
-
-                # follow specified time delay
-                time_compute = time.time() - start_time
-                if time_compute < self.update_model_dt:
-                    # computed too fast, way a bit to follow dt
-                    time.sleep(self.update_model_dt - time_compute)
+                    # save training history
+                    self.hist_train.append( (train_loss, val_loss) )
+
+                # follow specified time delay (the deadline is only
+                # advanced here, where the sleep actually happens, so
+                # unpaced iterations cannot build up a sleep backlog)
+                next_deadline += self.update_model_dt
+                sleep_time = next_deadline - time.perf_counter()
+                if sleep_time > 0:
+                    # computed too fast, wait a bit to follow dt
+                    time.sleep(sleep_time)
+                else:
+                    # running behind: re-anchor instead of bursting
+                    next_deadline = time.perf_counter()
+            else:
+                # validation set still filling: nothing to train on yet,
+                # so idle briefly instead of spinning
+                time.sleep(0.001)
+                next_deadline = time.perf_counter()
 
     def compare_models(self):
         """After training, load different models and plot time history
         of their predictions so one can visually compare them.
         """
         # list models
-        model_names = ['/initial_model.h5', '/final_model.h5']
-
-        # prepare validation data
-        val_input = self.memory.val_data['data_in']
-        val_states = val_input[:,0:self.memory.n_states]
-        val_controls = val_input[:,-self.memory.n_controls]
+        model_names = ['initial_model.h5', 'final_model.h5']
+
+        # prepare validation data: plain views into the validation array,
+        # no reshape/copy (the old [:, -n_controls] indexing also grabbed
+        # a single column and only worked for one control)
+        n_states = self.memory.n_states
+        n_controls = self.memory.n_controls
+        val_states = self.memory.val_in[:, :n_states]
+        val_controls = self.memory.val_in[:, n_states:n_states+n_controls]
         n_steps = self.memory.val_data_size
 
-        # make sure arrays have same structure
-        val_states = val_states.reshape(n_steps, self.memory.n_states)
-        val_controls = val_controls.reshape(n_steps, self.memory.n_controls)
-
         # MAIN LOOP
         for i in range(len(model_names)):
             # load model
-            model = load_model('./experiments/' + self.run_id + model_names[i])
+            model = load_model(os.path.join('./experiments', self.run_id,
+                                            model_names[i]))
             pred_states = np.zeros((n_steps, self.memory.n_states))
 
             # step-by-step prediction (using validation data)
@@ -259,10 +649,15 @@ class ThreadingModeling(object):
         """ Predict next states using current model based on current states and
         control performed.
         """
-        # format input data and predict different in next states
-        input_data = np.hstack((current_state, control))
-        delta_next_state = self.model.predict(input_data.reshape(
-            1, self.memory.n_inputs))
+        # write inputs into the reusable scratch row and run the stored
+        # forward pass directly
+        ns = self.memory.n_states
+        scratch = self._pred_scratch
+        scratch[0, :ns] = current_state
+        scratch[0, ns:] = control
+        delta_next_state = self.sess.run(
+            self.output_layer,
+            feed_dict={self.input_layer: scratch})
 
         # return next states
         next_state = current_state + delta_next_state[0]
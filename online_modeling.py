@@ -9,11 +9,18 @@ Online modeling using deep neural networks.
 0.0.3 (Apr/12/2018) : enabled model comparison method (mostly between initial
                       and final model generated)
 0.0.4 (Apr/17/2018) : added argparse
+0.0.5 (Aug/26/2026) : model updates use train_on_batch/test_on_batch instead
+                      of fit to cut per-batch overhead
+0.0.6 (Aug/26/2026) : MemoryBuffer moved to models.py (shared with the
+                      TensorFlow version) and stored as structure-of-arrays
+0.0.7 (Aug/26/2026) : added ProcessModeling (trains in a worker process
+                      over shared-memory buffers, --multiproc flag)
+0.0.8 (Aug/26/2026) : optional float16 experience storage (--half_buffer)
 
 """
 __author__ = "Vinicius G. Goecks"
-__version__ = "0.0.4"
-__date__ = "April 17, 2018"
+__version__ = "0.0.8"
+__date__ = "August 26, 2026"
 
 # import
 import numpy as np
@@ -23,148 +30,105 @@ import argparse
 import sys, os
 import time
 import threading
+import multiprocessing
+import queue
 import gym
 
 from keras.models import Sequential, load_model
 from keras.layers import Dense, Dropout, LSTM
 from keras.optimizers import SGD
+from keras import backend as K
 
+from models import MemoryBuffer
 
-class TestController(object):
-    """ Controller that takes random actions
-    """
+# numba is optional here just like in models.py: with it the per-tick
+# prediction runs a hand-rolled compiled forward pass, without it the
+# cached Keras function is used instead
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
-    def __init__(self, env):
-        self.env = env
-        self.action_space = env.action_space
-
-    def act(self, state):
-        """ Compute controls
-        """
-        control = self.action_space.sample()
-        return control
+    def njit(*args, **kwargs):
+        def wrap(func):
+            return func
+        return wrap
 
 
-class MemoryBuffer(object):
-    """ Stores experienced states and controls for modeling.
+@njit(cache=True, fastmath=True)
+def _mlp_forward(x, W0, b0, W1, b1, W2, b2, W3, b3):
+    """ Forward pass of the dense model over raw weight arrays (dropout
+    is identity at inference time).
 
-    Experiences are defined as:
-    [current_states, control_applied] -> [(next_states - current_states)]
+    For a single input row the math itself is microseconds; the framework
+    dispatch around it is what costs at 50 Hz, so the compiled pass skips
+    the framework entirely.
+    """
+    h0 = np.maximum(np.dot(x, W0) + b0, np.float32(0.))
+    h1 = np.maximum(np.dot(h0, W1) + b1, np.float32(0.))
+    h2 = np.maximum(np.dot(h1, W2) + b2, np.float32(0.))
+    return np.dot(h2, W3) + b3
 
-    This class also handles the creation of a validation set. This is filled 
-    before the memory buffer so the learned model can be evaluated on unseen
-    data (not the same data from the memory buffer that is used to improve 
-    the model).
 
-    Arguments
-    ==================
-    env: plant to model
-    buffer_size: number of experiences to store
+def build_model(n_inputs, n_outputs):
+    """ Build and compile the dense model used for online modeling.
     """
+    model = Sequential()
 
-    def __init__(self, env, buffer_size=100, val_data_size=100):
-        self.env = env
-        self.buffer_size = buffer_size
-        self.val_data_size = val_data_size
-
-        # create buffer
-        self.n_states = env.observation_space.shape[0]
-        self.n_controls = env.action_space.shape[0]
-        self.n_inputs = self.n_states + self.n_controls
-        self.n_outputs = self.n_states
-
-        self.buffer = np.zeros(self.buffer_size,
-                               dtype=[('data_in', np.float32,
-                                       (self.n_inputs,)),
-                                      ('data_out', np.float32,
-                                       (self.n_outputs,))])
-
-        self.buffer_counter = 0  # counts idx of where
-        # current experience should be placed
-
-        self.buffer_filled = False  # flag becomes true when reset counter for
-        # the first time
-
-        # create validation set
-        self.val_data = np.zeros(self.val_data_size,
-                                 dtype=[('data_in', np.float32,
-                                         (self.n_inputs,)),
-                                        ('data_out', np.float32,
-                                         (self.n_outputs,))])
-        self.val_data_counter = 0
-        self.val_data_filled = False
-
-    def add_to_buffer(self, current_state, control, next_state):
-        """ Organize data to fit buffer and manage number of experiences added.
-
-        Initially fills the validation data set, then fills the memory buffer.
-        """
-        # check first if validation set is filled
-        if not self.val_data_filled:
-            # add current experience to validation set
-            # simplify notation
-            idx = self.val_data_counter
-
-            # add inputs (current_state, control)
-            self.val_data[idx][0] = np.hstack([current_state, control])
+    # model.add(Dropout(0.2, input_shape=(input_dim,)))
+    model.add(Dense(220,
+                    input_shape=(n_inputs,),
+                    kernel_initializer='normal',
+                    activation='relu'))
 
-            # add output (next_state - current_state)
-            self.val_data[idx][1] = np.array([next_state - current_state])
+    # model.add(Dropout(0.2))
+    model.add(Dense(160, kernel_initializer='normal', activation='relu'))
+    model.add(Dropout(0.2))
+    model.add(Dense(130, kernel_initializer='normal', activation='relu'))
+    model.add(Dropout(0.2))
+    model.add(Dense(n_outputs,
+                    kernel_initializer='normal', activation='linear'))
 
-            # increase buffer_counter
-            self.val_data_counter += 1
+    # compile model
+    model.compile(loss='mse', optimizer='adam')
 
-            # if validation data is full, raise flag to stop
-            if self.val_data_counter == self.val_data_size:
-                print('[*] Filled validation set.')
-                self.val_data_filled = True
+    return model
 
-        else:  # validation set is full, fills memory buffer
-            # if buffer full, overwrite older experiences
-            if self.buffer_counter >= self.buffer_size:
-                # reset buffer_counter
-                self.buffer_counter = 0
-                self.buffer_filled = True
 
-            # simplify notation
-            idx = self.buffer_counter
+def make_val_function(model, val_in, val_out):
+    """ Build a validation-loss function with the (frozen) validation set
+    pinned as constants in the graph.
 
-            # add inputs (current_state, control)
-            self.buffer[idx][0] = np.hstack([current_state, control])
+    Feeding the validation arrays through test_on_batch copies them
+    host-to-device on every call; as constants they are uploaded once and
+    every later validation pass feeds no data at all. Call with
+    ([0]) (learning phase = test) and read the loss from the returned
+    list.
+    """
+    # the graph runs in floatx regardless of how the buffer stores the
+    # data, so half-precision validation sets are widened once here
+    val_in_t = K.constant(val_in.astype(np.float32, copy=False))
+    val_out_t = K.constant(val_out.astype(np.float32, copy=False))
+    val_pred_t = model(val_in_t)
+    val_loss_t = K.mean(K.square(val_pred_t - val_out_t))
 
-            # add output (next_state - current_state)
-            self.buffer[idx][1] = np.array([next_state - current_state])
+    return K.function([K.learning_phase()], [val_loss_t])
 
-            # increase buffer_counter
-            self.buffer_counter += 1
 
-    def generate_batch(self, batch_size=1, shuffle=False):
-        """ Sample and return batch of experiences
-        """
-        # check if buffer is filled
-        if self.buffer_filled:
-            # start batch from anywhere in the buffer
-            initial_idx = np.random.randint(
-                low=0,
-                high=(self.buffer_size - batch_size))
-            final_idx = initial_idx + batch_size
-
-        # if not, check if at least have enough experiences to return batch
-        elif batch_size < self.buffer_counter:
-            # start batch from anywhere in the filled part of buffer
-            initial_idx = np.random.randint(
-                low=0,
-                high=(self.buffer_counter - batch_size))
-            final_idx = initial_idx + batch_size
-        else:
-            # buffer doest have enough data to generate batch
-            return None, None
+class TestController(object):
+    """ Controller that takes random actions
+    """
 
-        # sample buffer
-        input_data = self.buffer['data_in'][initial_idx:final_idx]
-        output_data = self.buffer['data_out'][initial_idx:final_idx]
+    def __init__(self, env):
+        self.env = env
+        self.action_space = env.action_space
 
-        return input_data, output_data
+    def act(self, state):
+        """ Compute controls
+        """
+        control = self.action_space.sample()
+        return control
 
 
 class ThreadingModeling(object):
@@ -193,136 +157,182 @@ class ThreadingModeling(object):
         self.update_model_dt = update_model_dt  # how often should be model
         # be updated (sec) (assuming we
         #  have CPU power for that)
-        self.__init_model()
+        self._init_model()
 
         # run model updates in the background forever
-        self.thread = threading.Thread(target=self.__update_model, args=())
+        self.thread = threading.Thread(target=self._update_model, args=())
         self.thread.daemon = True    # kills background thread when main
         self.keep_computing_model = True  # flag to stop daemon
         # function is over
         self.thread.start()
 
-    def __init_model(self):
+    def _init_model(self):
         """ Initialize pre-defined model.
         """
         print('[*] Initializing model...')
-        model = Sequential()
 
-        # model.add(Dropout(0.2, input_shape=(input_dim,)))
-        model.add(Dense(220,
-                        input_shape=(self.memory.n_inputs,),
-                        kernel_initializer='normal',
-                        activation='relu'))
+        # save model internally and dump on file
+        self.model = build_model(self.memory.n_inputs, self.memory.n_outputs)
+        self.model.save(os.path.join('./experiments', self.run_id,
+                                     'initial_model.h5'))
+
+        # direct forward-pass function for the per-tick prediction:
+        # model.predict pays batch splitting, callback hooks, and output
+        # stitching on every call -- far more than the actual matmuls for
+        # a single input row
+        self._predict_fn = K.function([self.model.input,
+                                       K.learning_phase()],
+                                      [self.model.output])
+
+        # weight snapshot consumed by the compiled forward pass (filled
+        # in whenever the model is updated)
+        self._weights = None
+        self._weights_lock = threading.Lock()
+
+        # reusable input row for predict_next_states, so the per-tick
+        # prediction allocates nothing
+        self._pred_scratch = np.empty((1, self.memory.n_inputs),
+                                      dtype=np.float32)
+
+    def _update_model(self):
+        """ Receive new batch of data and update model.
 
-        # model.add(Dropout(0.2))
-        model.add(Dense(160, kernel_initializer='normal', activation='relu'))
-        model.add(Dropout(0.2))
-        model.add(Dense(130, kernel_initializer='normal', activation='relu'))
-        model.add(Dropout(0.2))
-        model.add(Dense(self.memory.n_outputs,
-                        kernel_initializer='normal', activation='linear'))
+        Uses the precompiled train_on_batch/test_on_batch functions instead
+        of fit() so every update skips the per-call dataset and callback
+        setup, and only runs the (full) validation pass every few updates.
+        """
+        # how many updates to run between validation passes
+        val_update_interval = 10
+        n_updates = 0
+        val_loss = np.inf
+        val_fn = None
 
-        # compile model
-        model.compile(loss='mse', optimizer='adam')
+        # persistent batch iterator over the experience buffer
+        batches = self.memory.iter_batches(batch_size=self.batch_size)
 
-        # save model internally and dump on file
-        self.model = model
-        self.model.save('./experiments/' + self.run_id + '/initial_model.h5')
+        # deadline-based pacing on the monotonic clock, same scheme as
+        # the simulation loop
+        next_deadline = time.perf_counter()
+
+        # total buffer writes seen at the last update
+        last_trained = -1
 
-    def __update_model(self):
-        """ Receive new batch of data and update model.
-        """
         while self.keep_computing_model:
-            start_time = time.time()
+            # nothing new since the last update: retraining on the same
+            # window is wasted work that only steals interpreter time
+            # from the simulation loop
+            n_experiences = self.memory.total_experiences
+            if n_experiences == last_trained:
+                time.sleep(0.001)
+                next_deadline = time.perf_counter()
+                continue
 
             # receive new data
-            input_data, output_data = self.memory.generate_batch(
-                batch_size=self.batch_size)
+            input_data, output_data = next(batches)
 
             # only update model when validation set is ready to use
             if self.memory.val_data_filled:
                 if input_data is not None:
                     # update model if data is not None
 
-                    # prepare validation data
-                    val_input = self.memory.val_data['data_in']
-                    val_output = self.memory.val_data['data_out']
-
-                    # # TODO: both options below seem to work fine, but need to do
-                    # # some research (or testing) to see if they are equivalent
-                    # option 1
-                    hist = self.model.fit( input_data, output_data, epochs=1,
-                                   steps_per_epoch=1, verbose=0,
-                                   validation_data=(val_input, val_output),
-                                   validation_steps=1)
-                    # # option 2
-                    # self.model.train_on_batch(input_data, output_data)
+                    # update model on current batch
+                    train_loss = self.model.train_on_batch(input_data,
+                                                           output_data)
+                    last_trained = n_experiences
+
+                    # snapshot the weights as plain arrays for the
+                    # compiled forward pass used by predict_next_states
+                    if NUMBA_AVAILABLE:
+                        weights = self.model.get_weights()
+                        with self._weights_lock:
+                            self._weights = weights
+
+                    # evaluate on validation data every few updates (the
+                    # validation set is frozen by now, so it is pinned
+                    # into the graph as constants on first use)
+                    if n_updates % val_update_interval == 0:
+                        if val_fn is None:
+                            val_fn = make_val_function(self.model,
+                                                       self.memory.val_in,
+                                                       self.memory.val_out)
+                        val_loss = val_fn([0])[0]
+                    n_updates += 1
 
                     # update list that tracks when model was updated
                     # print('[*] Model updated.')
                     self.track_model.append((self.epi_n+1, self.step_n))
 
-                    # save fit history
-                    self.hist_train.append( (hist.history['loss'][0],
-                                             hist.history['val_loss'][0]) )
-
-                # follow specified time delay
-                time_compute = time.time() - start_time
-                if time_compute < self.update_model_dt:
-                    # computed too fast, way a bit to follow dt
-                    time.sleep(self.update_model_dt - time_compute)
+                    # save training history
+                    self.hist_train.append( (train_loss, val_loss) )
+
+                # follow specified time delay (the deadline is only
+                # advanced here, where the sleep actually happens, so
+                # unpaced iterations cannot build up a sleep backlog)
+                next_deadline += self.update_model_dt
+                sleep_time = next_deadline - time.perf_counter()
+                if sleep_time > 0:
+                    # computed too fast, wait a bit to follow dt
+                    time.sleep(sleep_time)
+                else:
+                    # running behind: re-anchor instead of bursting
+                    next_deadline = time.perf_counter()
+            else:
+                # validation set still filling: nothing to train on yet,
+                # so idle briefly instead of spinning
+                time.sleep(0.001)
+                next_deadline = time.perf_counter()
 
     def compare_models(self):
         """After training, load different models and plot time history
         of their predictions so one can visually compare them.
         """
         # list models
-        model_names = ['/initial_model.h5', '/final_model.h5']
-
-        # prepare validation data
-        val_input = self.memory.val_data['data_in']
-        val_states = val_input[:,0:self.memory.n_states]
-        val_controls = val_input[:,-self.memory.n_controls]
+        model_names = ['initial_model.h5', 'final_model.h5']
+
+        # prepare validation data: plain views into the validation array,
+        # no reshape/copy (the old [:, -n_controls] indexing also grabbed
+        # a single column and only worked for one control)
+        n_states = self.memory.n_states
+        n_controls = self.memory.n_controls
+        val_states = self.memory.val_in[:, :n_states]
+        val_controls = self.memory.val_in[:, n_states:n_states+n_controls]
         n_steps = self.memory.val_data_size
 
-        # make sure arrays have same structure
-        val_states = val_states.reshape(n_steps, self.memory.n_states)
-        val_controls = val_controls.reshape(n_steps, self.memory.n_controls)
-
-        # MAIN LOOP
-        for i in range(len(model_names)):
-            # load model
-            model = load_model('./experiments/' + self.run_id + model_names[i])
-            pred_states = np.zeros((n_steps, self.memory.n_states))
-
-            # step-by-step prediction (using validation data)
-            current_state = val_states[0,:]
-            control = val_controls[0,:]
-
-            # store data
-            pred_states[0,:] = current_state
+        n_models = len(model_names)
+
+        # load every model up front and bind its light-weight predict
+        # function once: predict_on_batch skips the batch-splitting and
+        # callback setup model.predict pays on every call
+        predict_fns = []
+        for name in model_names:
+            model = load_model(os.path.join('./experiments',
+                                            self.run_id, name))
+            predict_fns.append(model.predict_on_batch)
+
+        # all models roll out in lockstep over one stacked batch: row m
+        # of batch_in/pred_states belongs to model m, so the input
+        # assembly per step is shared (the models are distinct graphs, so
+        # each still runs its own forward pass on its row)
+        batch_in = np.empty((n_models, self.memory.n_inputs),
+                            dtype=np.float32)
+        pred_states = np.zeros((n_models, n_steps, n_states))
+        pred_states[:, 0] = val_states[0]
 
-            for j in range(1,n_steps):
-
-                # predict next states
-                # format input data and predict different in next states
-                input_data = np.hstack((current_state, control))
-                delta_next_state = model.predict(input_data.reshape(
-                    1, self.memory.n_inputs))
-
-                # return next states
-                next_state = current_state + delta_next_state[0]
-
-                # update states and controls
-                current_state = next_state
-                control = val_controls[j,:]
-
-                # store data
-                pred_states[j,:] = current_state
-
-            # plot predicted data            
+        for j in range(1, n_steps):
+            # previous predicted state per model plus the recorded control
+            batch_in[:, :n_states] = pred_states[:, j-1]
+            batch_in[:, n_states:] = val_controls[j-1]
+
+            # predict difference in next states, one row per model
+            for m in range(n_models):
+                delta_next_state = predict_fns[m](batch_in[m:m+1])
+                pred_states[m, j] = pred_states[m, j-1] + \
+                    delta_next_state[0]
+
+        # plot predicted data (one figure per model)
+        for i in range(n_models):
             plt.figure()
-            
+
             # plot states
             for l in range(self.memory.n_states):
                 plt.subplot(self.memory.n_states+1, 1, l+1)
@@ -330,13 +340,14 @@ class ThreadingModeling(object):
                     plt.title('Model comparison: {}'.format(model_names[i]))
 
                 plt.plot(val_states[:, l], '-', label='x{}'.format(l))
-                plt.plot(pred_states[:, l], '--', label='pred_x{}'.format(l))
+                plt.plot(pred_states[i, :, l], '--',
+                         label='pred_x{}'.format(l))
                 plt.grid()
                 plt.legend(loc='best')
 
             # plot controls
             plt.subplot(self.memory.n_states+1, 1, self.memory.n_states+1)
-            for m in range(n_controls):
+            for m in range(self.memory.n_controls):
                 plt.plot(val_controls[:, m], label='u{}'.format(m))
 
             plt.grid()
@@ -348,10 +359,28 @@ class ThreadingModeling(object):
         """ Predict next states using current model based on current states and
         control performed.
         """
-        # format input data and predict different in next states
-        input_data = np.hstack((current_state, control))
-        delta_next_state = self.model.predict(input_data.reshape(
-            1, self.memory.n_inputs))
+        # write inputs into the reusable scratch row: two slice stores,
+        # no per-call allocation
+        ns = self.memory.n_states
+        scratch = self._pred_scratch
+        scratch[0, :ns] = current_state
+        scratch[0, ns:] = control
+
+        # compiled forward pass over the latest weight snapshot when
+        # available (i.e. numba installed and at least one update done),
+        # Keras function otherwise
+        with self._weights_lock:
+            weights = self._weights
+
+        if weights is not None:
+            delta_next_state = _mlp_forward(scratch[0], weights[0],
+                                            weights[1], weights[2],
+                                            weights[3], weights[4],
+                                            weights[5], weights[6],
+                                            weights[7])
+            return current_state + delta_next_state
+
+        delta_next_state = self._predict_fn([scratch, 0])[0]
 
         # return next states
         next_state = current_state + delta_next_state[0]
@@ -363,6 +392,175 @@ class ThreadingModeling(object):
         self.keep_computing_model = False
 
 
+def _trainer_loop(shared_arrays, n_states, n_controls, buffer_size,
+                  val_data_size, batch_size, update_model_dt,
+                  weight_queue, hist_queue, stop_event):
+    """ Training loop executed inside the ProcessModeling worker process.
+
+    Rebuilds views over the shared experience buffers, trains a local copy
+    of the model, and ships the updated weights back to the simulation
+    process through the weight queue.
+    """
+    # the parent built (and saved) its model before forking, so the child
+    # inherits Keras's cached session and default graph. TF sessions are
+    # not fork-safe -- their thread pools die in the fork and the first
+    # session.run here would block forever -- so drop the inherited state
+    # and start from a fresh graph and session owned by this process
+    K.clear_session()
+
+    memory = MemoryBuffer(buffer_size=buffer_size,
+                          val_data_size=val_data_size,
+                          n_states=n_states, n_controls=n_controls,
+                          shared_arrays=shared_arrays)
+    model = build_model(memory.n_inputs, memory.n_outputs)
+
+    # how many updates to run between validation passes (updated weights
+    # are shipped on the same schedule)
+    val_update_interval = 10
+    n_updates = 0
+    val_loss = np.inf
+    val_fn = None
+
+    # persistent batch iterator over the shared experience buffer
+    batches = memory.iter_batches(batch_size=batch_size)
+
+    # deadline-based pacing on the monotonic clock, same scheme as the
+    # simulation loop
+    next_deadline = time.perf_counter()
+
+    # total buffer writes seen at the last update
+    last_trained = -1
+
+    while not stop_event.is_set():
+        # nothing new since the last update: retraining on the same
+        # window is wasted work
+        n_experiences = memory.total_experiences
+        if n_experiences == last_trained:
+            time.sleep(0.001)
+            next_deadline = time.perf_counter()
+            continue
+
+        # receive new data
+        input_data, output_data = next(batches)
+
+        # only update model when validation set is ready to use
+        if memory.val_data_filled and input_data is not None:
+            train_loss = model.train_on_batch(input_data, output_data)
+            last_trained = n_experiences
+
+            # evaluate on validation data and ship the new weights every
+            # few updates
+            if n_updates % val_update_interval == 0:
+                if val_fn is None:
+                    val_fn = make_val_function(model, memory.val_in,
+                                               memory.val_out)
+                val_loss = val_fn([0])[0]
+                weight_queue.put(model.get_weights())
+            n_updates += 1
+
+            hist_queue.put((train_loss, val_loss))
+
+        # follow specified time delay (the deadline is only advanced
+        # here, next to the sleep it feeds)
+        next_deadline += update_model_dt
+        sleep_time = next_deadline - time.perf_counter()
+        if sleep_time > 0:
+            # computed too fast, wait a bit to follow dt
+            time.sleep(sleep_time)
+        else:
+            # running behind: re-anchor instead of bursting
+            next_deadline = time.perf_counter()
+
+
+class ProcessModeling(ThreadingModeling):
+    """ Same interface as ThreadingModeling, but runs the model updates in
+    a separate process instead of a thread.
+
+    A training thread still serializes with the simulation loop whenever
+    either side holds the interpreter lock; a worker process trains truly
+    in parallel. The experience buffers live in shared memory (create the
+    MemoryBuffer with shared=True) so the worker sees new experiences
+    with zero copy, and it periodically ships updated weights back
+    through a queue. predict_next_states applies the newest weights
+    before predicting.
+    """
+
+    def __init__(self, memory_buffer, batch_size=1, update_model_dt=0,
+                 run_id='test'):
+        if memory_buffer.shared_arrays is None:
+            raise ValueError('ProcessModeling requires a MemoryBuffer '
+                             'created with shared=True')
+
+        # keep track of current epi and time step to know model is updated
+        self.run_id = run_id
+        self.epi_n = 0
+        self.step_n = 0
+        self.track_model = []
+        self.hist_train = []
+
+        # initialize memory buffer
+        self.memory = memory_buffer
+
+        # local copy of the model, used for predictions only
+        self.batch_size = batch_size
+        self.update_model_dt = update_model_dt
+        self._init_model()
+
+        # run model updates in a background worker process
+        self._weight_queue = multiprocessing.Queue()
+        self._hist_queue = multiprocessing.Queue()
+        self._stop_event = multiprocessing.Event()
+        self.process = multiprocessing.Process(
+            target=_trainer_loop,
+            args=(memory_buffer.shared_arrays, memory_buffer.n_states,
+                  memory_buffer.n_controls, memory_buffer.buffer_size,
+                  memory_buffer.val_data_size, batch_size, update_model_dt,
+                  self._weight_queue, self._hist_queue, self._stop_event))
+        self.process.daemon = True
+        self.process.start()
+
+    def _sync_model(self):
+        """ Apply the newest weights shipped by the worker, if any, and
+        collect the training history produced so far.
+        """
+        weights = None
+        while True:
+            try:
+                weights = self._weight_queue.get_nowait()
+            except queue.Empty:
+                break
+
+        if weights is not None:
+            self.model.set_weights(weights)
+            if NUMBA_AVAILABLE:
+                with self._weights_lock:
+                    self._weights = weights
+            self.track_model.append((self.epi_n+1, self.step_n))
+
+        while True:
+            try:
+                self.hist_train.append(self._hist_queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def predict_next_states(self, current_state, control):
+        """ Predict next states using the latest model received from the
+        worker process.
+        """
+        self._sync_model()
+        return ThreadingModeling.predict_next_states(self, current_state,
+                                                     control)
+
+    def close(self):
+        """ Stop the worker process and collect any remaining history.
+        """
+        self._stop_event.set()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self._sync_model()
+
+
 if __name__ == '__main__':
     """ Testing controller on a simple OpenAI Gym environment: Pendulum-v1
 
@@ -407,6 +605,12 @@ if __name__ == '__main__':
                                      help='size of validation dataset')
     ap.add_argument('--batch_size', default=16, required=False,
                                      help='batch size for model updates')
+    ap.add_argument('--multiproc', action='store_true',
+                                     help='train in a separate process '
+                                          'instead of a thread')
+    ap.add_argument('--half_buffer', action='store_true',
+                                     help='store experiences as float16 '
+                                          '(halves buffer bandwidth)')
     args = vars(ap.parse_args())
     
     # options    
@@ -414,7 +618,7 @@ if __name__ == '__main__':
     PLOTTING = not args['no_plot']
 
     # define experiment id and create folder to store results
-    os.system('mkdir ./experiments/{}'.format(run_id))
+    os.makedirs(os.path.join('./experiments', run_id), exist_ok=True)
 
     # create environment (plant)
     ENV_NAME = 'Pendulum-v0'
@@ -426,12 +630,17 @@ if __name__ == '__main__':
     agent = TestController(env)
 
     # starts modeling in the background with memory buffer
+    buffer_dtype = np.float16 if args['half_buffer'] else np.float32
     memory = MemoryBuffer(env, buffer_size=args['buffer_size'],
-                               val_data_size=args['val_data_size'])
-    modeling = ThreadingModeling(memory_buffer=memory,
-                                 batch_size=args['batch_size'],
-                                 update_model_dt=0.5,
-                                 run_id=run_id)
+                               val_data_size=args['val_data_size'],
+                               shared=args['multiproc'],
+                               dtype=buffer_dtype)
+    modeling_class = ProcessModeling if args['multiproc'] \
+        else ThreadingModeling
+    modeling = modeling_class(memory_buffer=memory,
+                              batch_size=args['batch_size'],
+                              update_model_dt=0.5,
+                              run_id=run_id)
 
     # general simulation parameters
     n_episodes = args['n_eps']
@@ -441,26 +650,41 @@ if __name__ == '__main__':
     # store states (current and predicted) and actions
     # TODO:
     # create a data logger class to make it cleaner
-    # format: (timestep x data) x episodes
-    states = np.zeros((n_steps, n_states, n_episodes))
-    pred_states = np.zeros((n_steps, n_states, n_episodes))
-    controls = np.zeros((n_steps, n_controls, n_episodes))
+    # format: episodes x timesteps x data (episode outermost so the
+    # per-step write is one unit-stride copy)
+    states = np.zeros((n_episodes, n_steps, n_states))
+    pred_states = np.zeros((n_episodes, n_steps, n_states))
+    controls = np.zeros((n_episodes, n_steps, n_controls))
 
     print('[*] Simulating...')
+
+    # bind the per-step calls to locals: at 50 Hz the repeated attribute
+    # lookups in the inner loop are not free
+    _act = agent.act
+    _step = env.step
+    _add_to_buffer = modeling.memory.add_to_buffer
+    _predict = modeling.predict_next_states
+    _perf = time.perf_counter
+
     for i in range(n_episodes):
         print('[*] Episode {} out of {}'.format(i+1, n_episodes))
         # get initial states
         state = env.reset()
 
         # log initial data
-        states[0, :, i] = state
-        pred_states[0, :, i] = state
-        controls[0, :, i] = np.zeros(n_controls)
+        states[i, 0] = state
+        pred_states[i, 0] = state
+        controls[i, 0] = np.zeros(n_controls)
+
+        # deadline-based pacing: sleeping for (dt - elapsed) accumulates
+        # drift over an episode, so track the next deadline on the
+        # monotonic clock instead
+        next_deadline = _perf()
 
         for j in range(1, n_steps):
             if j%100 == 0:
                 print('[*] Time step {}+/{}'.format(j,n_steps))
-            start_time = time.time()
+            next_deadline += sim_dt
             # modeling keeps track of current epi and time step
             modeling.epi_n = i
             modeling.step_n = j
@@ -469,36 +693,41 @@ if __name__ == '__main__':
             current_state = state
 
             # compute control based on current state
-            control = agent.act(state)
+            control = _act(state)
 
             # execute control and observe next states
-            state, _, done, _ = env.step(control)
+            state, _, done, _ = _step(control)
 
             # add experience to buffer
-            modeling.memory.add_to_buffer(current_state, control, state)
+            _add_to_buffer(current_state, control, state)
 
             # use current model to predict next states
-            pred_state = modeling.predict_next_states(current_state, control)
+            pred_state = _predict(current_state, control)
 
             # log data
-            states[j, :, i] = state
-            pred_states[j, :, i] = pred_state
-            controls[j, :, i] = control
+            states[i, j] = state
+            pred_states[i, j] = pred_state
+            controls[i, j] = control
 
             # follow specified time delay
-            time_compute = time.time() - start_time
-            if time_compute < sim_dt:
-                # computed too fast, way a bit to follow dt
-                time.sleep(sim_dt - time_compute)
+            sleep_time = next_deadline - _perf()
+            if sleep_time > 0:
+                # computed too fast, wait a bit to follow dt
+                time.sleep(sleep_time)
+            else:
+                # running behind: re-anchor instead of bursting to catch up
+                next_deadline = _perf()
 
     # close everything and stop modeling
     env.close()
     modeling.close()
 
     # save last model and data
-    modeling.model.save('./experiments/' + modeling.run_id + '/final_model.h5')
+    modeling.model.save(os.path.join('./experiments', modeling.run_id,
+                                     'final_model.h5'))
     hist_train = np.array(modeling.hist_train)
-    np.save('./experiments/' + run_id + '/model_hist.npy', hist_train)
+    np.save(os.path.join('./experiments', run_id, 'model_hist.npy'),
+            hist_train)
 
     # plot results (cycle for different episodes)
     if PLOTTING:
@@ -527,11 +756,11 @@ if __name__ == '__main__':
                 if l == 0:
                     plt.title('Episode {} out of {}'.format(k+1, n_episodes))
 
-                plt.plot(states[:, l, k], '-',
+                plt.plot(states[k, :, l], '-',
                          label='x{}'.format(l))
-                plt.plot(pred_states[:, l, k], '--',
+                plt.plot(pred_states[k, :, l], '--',
                          label='pred_x{}'.format(l))
-                plt.plot(idx_updates, pred_states[idx_updates, l, k], 'kx',
+                plt.plot(idx_updates, pred_states[k, idx_updates, l], 'kx',
                          label='new_model')
                 plt.grid()
                 plt.legend(loc='best')
@@ -539,7 +768,7 @@ if __name__ == '__main__':
             # plot controls
             plt.subplot(n_states+1, 1, n_states+1)
             for m in range(n_controls):
-                plt.plot(controls[:, m, k], label='u{}'.format(m))
+                plt.plot(controls[k, :, m], label='u{}'.format(m))
 
             plt.grid()
             plt.legend(loc='best')
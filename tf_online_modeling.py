@@ -25,7 +25,7 @@ import tensorflow as tf
 
 
 
-from models import ThreadingModeling
+from models import ThreadingModeling, MemoryBuffer
 
 class TestController(object):
     """ Controller that takes random actions
@@ -42,129 +42,6 @@ class TestController(object):
         return control
 
 
-class MemoryBuffer(object):
-    """ Stores experienced states and controls for modeling.
-
-    Experiences are defined as:
-    [current_states, control_applied] -> [(next_states - current_states)]
-
-    This class also handles the creation of a validation set. This is filled 
-    before the memory buffer so the learned model can be evaluated on unseen
-    data (not the same data from the memory buffer that is used to improve 
-    the model).
-
-    Arguments
-    ==================
-    env: plant to model
-    buffer_size: number of experiences to store
-    """
-
-    def __init__(self, env, buffer_size=100, val_data_size=100):
-        self.env = env
-        self.buffer_size = buffer_size
-        self.val_data_size = val_data_size
-
-        # create buffer
-        self.n_states = env.observation_space.shape[0]
-        self.n_controls = env.action_space.shape[0]
-        self.n_inputs = self.n_states + self.n_controls
-        self.n_outputs = self.n_states
-
-        self.buffer = np.zeros(self.buffer_size,
-                               dtype=[('data_in', np.float32,
-                                       (self.n_inputs,)),
-                                      ('data_out', np.float32,
-                                       (self.n_outputs,))])
-
-        self.buffer_counter = 0  # counts idx of where
-        # current experience should be placed
-
-        self.buffer_filled = False  # flag becomes true when reset counter for
-        # the first time
-
-        # create validation set
-        self.val_data = np.zeros(self.val_data_size,
-                                 dtype=[('data_in', np.float32,
-                                         (self.n_inputs,)),
-                                        ('data_out', np.float32,
-                                         (self.n_outputs,))])
-        self.val_data_counter = 0
-        self.val_data_filled = False
-
-    def add_to_buffer(self, current_state, control, next_state):
-        """ Organize data to fit buffer and manage number of experiences added.
-
-        Initially fills the validation data set, then fills the memory buffer.
-        """
-        # check first if validation set is filled
-        if not self.val_data_filled:
-            # add current experience to validation set
-            # simplify notation
-            idx = self.val_data_counter
-
-            # add inputs (current_state, control)
-            self.val_data[idx][0] = np.hstack([current_state, control])
-
-            # add output (next_state - current_state)
-            self.val_data[idx][1] = np.array([next_state - current_state])
-
-            # increase buffer_counter
-            self.val_data_counter += 1
-
-            # if validation data is full, raise flag to stop
-            if self.val_data_counter == self.val_data_size:
-                print('[*] Filled validation set.')
-                self.val_data_filled = True
-
-        else:  # validation set is full, fills memory buffer
-            # if buffer full, overwrite older experiences
-            if self.buffer_counter >= self.buffer_size:
-                # reset buffer_counter
-                self.buffer_counter = 0
-                self.buffer_filled = True
-
-            # simplify notation
-            idx = self.buffer_counter
-
-            # add inputs (current_state, control)
-            self.buffer[idx][0] = np.hstack([current_state, control])
-
-            # add output (next_state - current_state)
-            self.buffer[idx][1] = np.array([next_state - current_state])
-
-            # increase buffer_counter
-            self.buffer_counter += 1
-
-    def generate_batch(self, batch_size=1, shuffle=False):
-        """ Sample and return batch of experiences
-        """
-        # check if buffer is filled
-        if self.buffer_filled:
-            # start batch from anywhere in the buffer
-            initial_idx = np.random.randint(
-                low=0,
-                high=(self.buffer_size - batch_size))
-            final_idx = initial_idx + batch_size
-
-        # if not, check if at least have enough experiences to return batch
-        elif batch_size < self.buffer_counter:
-            # start batch from anywhere in the filled part of buffer
-            initial_idx = np.random.randint(
-                low=0,
-                high=(self.buffer_counter - batch_size))
-            final_idx = initial_idx + batch_size
-        else:
-            # buffer doest have enough data to generate batch
-            return None, None
-
-        # sample buffer
-        input_data = self.buffer['data_in'][initial_idx:final_idx]
-        output_data = self.buffer['data_out'][initial_idx:final_idx]
-
-        return input_data, output_data
-
-
-
 if __name__ == '__main__':
     """ Testing controller on a simple OpenAI Gym environment: Pendulum-v1
 
@@ -216,7 +93,7 @@ if __name__ == '__main__':
     PLOTTING = not args['no_plot']
 
     # define experiment id and create folder to store results
-    os.system('mkdir ./experiments/{}'.format(run_id))
+    os.makedirs(os.path.join('./experiments', run_id), exist_ok=True)
 
     # create environment (plant)
     ENV_NAME = 'Pendulum-v0'
@@ -243,26 +120,41 @@ if __name__ == '__main__':
     # store states (current and predicted) and actions
     # TODO:
     # create a data logger class to make it cleaner
-    # format: (timestep x data) x episodes
-    states = np.zeros((n_steps, n_states, n_episodes))
-    pred_states = np.zeros((n_steps, n_states, n_episodes))
-    controls = np.zeros((n_steps, n_controls, n_episodes))
+    # format: episodes x timesteps x data (episode outermost so the
+    # per-step write is one unit-stride copy)
+    states = np.zeros((n_episodes, n_steps, n_states))
+    pred_states = np.zeros((n_episodes, n_steps, n_states))
+    controls = np.zeros((n_episodes, n_steps, n_controls))
 
     print('[*] Simulating...')
+
+    # bind the per-step calls to locals: at 50 Hz the repeated attribute
+    # lookups in the inner loop are not free
+    _act = agent.act
+    _step = env.step
+    _add_to_buffer = modeling.memory.add_to_buffer
+    _predict = modeling.predict_next_states
+    _perf = time.perf_counter
+
     for i in range(n_episodes):
         print('[*] Episode {} out of {}'.format(i+1, n_episodes))
         # get initial states
         state = env.reset()
 
         # log initial data
-        states[0, :, i] = state
-        pred_states[0, :, i] = state
-        controls[0, :, i] = np.zeros(n_controls)
+        states[i, 0] = state
+        pred_states[i, 0] = state
+        controls[i, 0] = np.zeros(n_controls)
+
+        # deadline-based pacing: sleeping for (dt - elapsed) accumulates
+        # drift over an episode, so track the next deadline on the
+        # monotonic clock instead
+        next_deadline = _perf()
 
         for j in range(1, n_steps):
             if j%100 == 0:
                 print('[*] Time step {}+/{}'.format(j,n_steps))
-            start_time = time.time()
+            next_deadline += sim_dt
             # modeling keeps track of current epi and time step
             modeling.epi_n = i
             modeling.step_n = j
@@ -271,36 +163,41 @@ if __name__ == '__main__':
             current_state = state
 
             # compute control based on current state
-            control = agent.act(state)
+            control = _act(state)
 
             # execute control and observe next states
-            state, _, done, _ = env.step(control)
+            state, _, done, _ = _step(control)
 
             # add experience to buffer
-            modeling.memory.add_to_buffer(current_state, control, state)
+            _add_to_buffer(current_state, control, state)
 
             # use current model to predict next states
-            pred_state = modeling.predict_next_states(current_state, control)
+            pred_state = _predict(current_state, control)
 
             # log data
-            states[j, :, i] = state
-            pred_states[j, :, i] = pred_state
-            controls[j, :, i] = control
+            states[i, j] = state
+            pred_states[i, j] = pred_state
+            controls[i, j] = control
 
             # follow specified time delay
-            time_compute = time.time() - start_time
-            if time_compute < sim_dt:
-                # computed too fast, way a bit to follow dt
-                time.sleep(sim_dt - time_compute)
+            sleep_time = next_deadline - _perf()
+            if sleep_time > 0:
+                # computed too fast, wait a bit to follow dt
+                time.sleep(sleep_time)
+            else:
+                # running behind: re-anchor instead of bursting to catch up
+                next_deadline = _perf()
 
     # close everything and stop modeling
     env.close()
     modeling.close()
 
     # save last model and data
-    modeling.model.save('./experiments/' + modeling.run_id + '/final_model.h5')
+    modeling.model.save(os.path.join('./experiments', modeling.run_id,
+                                     'final_model.h5'))
     hist_train = np.array(modeling.hist_train)
-    np.save('./experiments/' + run_id + '/model_hist.npy', hist_train)
+    np.save(os.path.join('./experiments', run_id, 'model_hist.npy'),
+            hist_train)
 
     # plot results (cycle for different episodes)
     if PLOTTING:
@@ -329,11 +226,11 @@ if __name__ == '__main__':
                 if l == 0:
                     plt.title('Episode {} out of {}'.format(k+1, n_episodes))
 
-                plt.plot(states[:, l, k], '-',
+                plt.plot(states[k, :, l], '-',
                          label='x{}'.format(l))
-                plt.plot(pred_states[:, l, k], '--',
+                plt.plot(pred_states[k, :, l], '--',
                          label='pred_x{}'.format(l))
-                plt.plot(idx_updates, pred_states[idx_updates, l, k], 'kx',
+                plt.plot(idx_updates, pred_states[k, idx_updates, l], 'kx',
                          label='new_model')
                 plt.grid()
                 plt.legend(loc='best')
@@ -341,7 +238,7 @@ if __name__ == '__main__':
             # plot controls
             plt.subplot(n_states+1, 1, n_states+1)
             for m in range(n_controls):
-                plt.plot(controls[:, m, k], label='u{}'.format(m))
+                plt.plot(controls[k, :, m], label='u{}'.format(m))
 
             plt.grid()
             plt.legend(loc='best')